@@ -0,0 +1,108 @@
+"""
+Measures the resident memory of the bot under the default and low-memory cache profiles, without a gateway connection,
+by feeding synthetic GUILD_CREATE and MESSAGE_CREATE payloads into the client's connection state.
+
+Run from the repository root with ``python -m bench.memory_profile``. Each profile is measured in a fresh interpreter.
+"""
+import argparse
+import asyncio
+import gc
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+import discord
+
+from src.features.starboard import Starboard
+from src.utils.memory import current_rss_mib
+
+GUILD_COUNT: int = 100
+CHANNELS_PER_GUILD: int = 10
+VOICE_MEMBERS_PER_GUILD: int = 10
+MESSAGES_PER_GUILD: int = 100
+
+BOT_ID: int = 1
+TIMESTAMP: str = datetime(2026, 1, 1, tzinfo=timezone.utc).isoformat()
+
+
+def user_payload(user_id: int) -> dict:
+    return {"id": str(user_id), "username": f"user{user_id}", "global_name": f"User {user_id}",
+            "discriminator": "0", "avatar": None}
+
+
+def member_payload(user_id: int) -> dict:
+    return {"user": user_payload(user_id), "roles": [], "joined_at": TIMESTAMP, "deaf": False, "mute": False}
+
+
+def guild_payload(guild_id: int) -> dict:
+    first_channel_id: int = guild_id * 1000
+    voice_channel_id: int = first_channel_id + CHANNELS_PER_GUILD
+    voice_user_ids: range = range(guild_id * 1000 + 1, guild_id * 1000 + 1 + VOICE_MEMBERS_PER_GUILD)
+    return {
+        "id": str(guild_id), "name": f"Guild {guild_id}", "owner_id": str(BOT_ID), "member_count": 1000,
+        "roles": [{"id": str(guild_id), "name": "@everyone", "permissions": "0", "position": 0, "color": 0,
+                   "colors": {"primary_color": 0, "secondary_color": None, "tertiary_color": None},
+                   "hoist": False, "managed": False, "mentionable": False}],
+        "channels": [{"id": str(first_channel_id + i), "type": 0, "name": f"channel-{i}", "position": i}
+                     for i in range(CHANNELS_PER_GUILD)] +
+                    [{"id": str(voice_channel_id), "type": 2, "name": "voice", "position": CHANNELS_PER_GUILD}],
+        "members": [member_payload(BOT_ID)] + [member_payload(user_id) for user_id in voice_user_ids],
+        "voice_states": [{"user_id": str(user_id), "channel_id": str(voice_channel_id), "session_id": "0",
+                          "deaf": False, "mute": False, "self_deaf": False, "self_mute": False,
+                          "suppress": False} for user_id in voice_user_ids],
+        "emojis": [], "stickers": [], "threads": [], "features": [],
+    }
+
+
+def message_payload(guild_id: int, index: int) -> dict:
+    author_id: int = guild_id * 1000 + 500 + index % 50
+    return {
+        "id": str(guild_id * 100000 + index), "channel_id": str(guild_id * 1000 + index % CHANNELS_PER_GUILD),
+        "guild_id": str(guild_id), "author": user_payload(author_id),
+        "member": {"roles": [], "joined_at": TIMESTAMP, "deaf": False, "mute": False},
+        "content": f"Synthetic message {index} " * 8, "timestamp": TIMESTAMP, "edited_timestamp": None,
+        "tts": False, "mention_everyone": False, "mentions": [], "mention_roles": [], "attachments": [],
+        "embeds": [], "pinned": False, "type": 0,
+    }
+
+
+async def measure(low_memory: bool):
+    intents = discord.Intents.default()
+    intents.message_content = True
+    client = Starboard(command_prefix='$', intents=intents, low_memory=low_memory)
+    state = client._connection
+    state.user = discord.ClientUser(state=state, data=user_payload(BOT_ID))
+
+    gc.collect()
+    baseline: float = current_rss_mib()
+    for guild_id in range(2, GUILD_COUNT + 2):
+        state.parse_guild_create(guild_payload(guild_id))
+        for index in range(MESSAGES_PER_GUILD):
+            state.parse_message_create(message_payload(guild_id, index))
+            # Let the dispatched event tasks finish, so that they do not hold on to messages while measuring.
+            while len(asyncio.all_tasks()) > 1:
+                await asyncio.sleep(0)
+    gc.collect()
+
+    cached_members: int = sum(len(guild.members) for guild in client.guilds)
+    cached_messages: int = len(client.cached_messages)
+    print(f"{'low-memory' if low_memory else 'default'}: {len(client.guilds)} guilds, "
+          f"{GUILD_COUNT * MESSAGES_PER_GUILD} messages fed, {cached_members} members and {cached_messages} messages "
+          f"cached, {current_rss_mib():.1f} MiB RSS ({current_rss_mib() - baseline:+.1f} MiB from state)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--profile", choices=["default", "low-memory"])
+    arguments = parser.parse_args()
+
+    if arguments.profile is not None:
+        asyncio.run(measure(arguments.profile == "low-memory"))
+        return
+
+    for profile in ["default", "low-memory"]:
+        subprocess.run([sys.executable, "-m", "bench.memory_profile", "--profile", profile], check=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+import logging
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Dict, Deque, Tuple, Callable, Awaitable, Iterator, Any
+
+
+class ServiceMode(IntEnum):
+    """
+    The stages of degradation the bot passes through under load. Each stage keeps the restrictions of those before it.
+    """
+
+    FULL = 0
+    """
+    Every handler does its full work.
+    """
+
+    DEFER_AUTO_REACTS = 1
+    """
+    Copying reactions onto starboard posts is postponed until full service returns.
+    """
+
+    THROTTLE_EDITS = 2
+    """
+    Existing starboard posts are edited at most once per edit interval; a skipped edit is sent once the interval ends.
+    """
+
+    SHED_REPLY_CONTEXT = 3
+    """
+    Starboard embeds no longer fetch the message being replied to.
+    """
+
+
+background_requests: ContextVar[bool] = ContextVar("background_requests", default=False)
+"""
+Set within background work, such as the startup warm-up, whose REST requests must not count as pressure on live
+reaction handling. Tasks started from such work inherit the flag.
+"""
+
+
+class OverloadController:
+    """
+    Watches handler concurrency, event-loop lag and REST waits, and picks a service mode accordingly.
+    """
+
+    mode: ServiceMode
+    """
+    The service mode handlers should currently honour.
+    """
+
+    in_flight: int
+    """
+    The number of reaction handlers currently running.
+    """
+
+    loop_lag: float
+    """
+    How late, in seconds, the most recent monitor tick ran compared to its schedule.
+    """
+
+    mode_changes: Dict[ServiceMode, int]
+    """
+    How many times the controller has entered each service mode.
+    """
+
+    rate_limit_waits: Deque[Tuple[float, float]]
+    """
+    The (monotonic start, monotonic end) intervals that recent live REST requests spent queued behind an exhausted
+    rate limit bucket or the global rate limit.
+    """
+
+    deferred: Dict[object, Callable[[], Awaitable[None]]]
+    """
+    Postponed work keyed so that repeated postponements of the same job collapse into one, replayed on recovery.
+    """
+
+    pending_edits: Dict[int, Callable[[], Awaitable[None]]]
+    """
+    Maps a starboard message ID to the trailing edit owed to it once its edit interval ends.
+    """
+
+    last_edits: Dict[int, float]
+    """
+    Maps a starboard message ID to the monotonic time it was last edited.
+    """
+
+    # (in-flight handlers, loop lag seconds, rate limit seconds waited within the window) needed to enter each mode.
+    thresholds: Dict[ServiceMode, Tuple[int, float, float]] = {
+        ServiceMode.DEFER_AUTO_REACTS: (8, 0.10, 2.0),
+        ServiceMode.THROTTLE_EDITS: (16, 0.25, 5.0),
+        ServiceMode.SHED_REPLY_CONTEXT: (32, 0.50, 10.0),
+    }
+    rate_limit_window: float = 30.0
+    # A request that had to queue is expected to spend this many seconds on the request itself once let through.
+    expected_request_time: float = 0.5
+    recovery_delay: float = 30.0
+    edit_interval: float = 15.0
+
+    last_pressure_time: float
+
+    def __init__(self):
+        self.mode = ServiceMode.FULL
+        self.in_flight = 0
+        self.loop_lag = 0.0
+        self.mode_changes = {mode: 0 for mode in ServiceMode}
+        self.rate_limit_waits = deque()
+        self.deferred = {}
+        self.pending_edits = {}
+        self.last_edits = {}
+        self.last_pressure_time = time.monotonic()
+
+    @contextmanager
+    def track(self) -> Iterator[None]:
+        """
+        Counts the wrapped handler as in flight for as long as it runs.
+        """
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+
+    def record_wait(self, started: float, ended: float):
+        """
+        Records a queued REST request, counting the time beyond the expected request time as spent waiting.
+        :param started: The monotonic time the request was made.
+        :param ended: The monotonic time the request finished.
+        """
+        if ended - started > self.expected_request_time:
+            self.rate_limit_waits.append((started, ended - self.expected_request_time))
+
+    def time_requests(self, http: Any):
+        """
+        Wraps a py-cord HTTPClient's request method so that live REST requests which have to queue behind an
+        exhausted bucket, or behind the global rate limit, are timed. Requests that go straight through are not
+        counted, however slow the network is.
+        :param http: The client's HTTPClient.
+        """
+        request: Callable[..., Awaitable[Any]] = http.request
+
+        async def timed_request(route: Any, *args: Any, **kwargs: Any) -> Any:
+            if background_requests.get():
+                return await request(route, *args, **kwargs)
+
+            # py-cord holds a bucket's lock for as long as the bucket is exhausted, and clears _global_over during a
+            # global rate limit, so either being taken means this request is about to sleep.
+            lock = getattr(http, "_locks", {}).get(route.bucket)
+            global_over = getattr(http, "_global_over", None)
+            queued: bool = ((lock is not None and lock.locked()) or
+                            (global_over is not None and not global_over.is_set()))
+            started: float = time.monotonic()
+            try:
+                return await request(route, *args, **kwargs)
+            finally:
+                if queued:
+                    self.record_wait(started, time.monotonic())
+
+        http.request = timed_request
+
+    def rate_limit_wait(self, now: float) -> float:
+        """
+        :return: The seconds within the rate limit window during which at least one live REST request was waiting.
+        Overlapping waits, such as several requests queued behind the same bucket, are only counted once.
+        """
+        window_start: float = now - self.rate_limit_window
+        while self.rate_limit_waits and self.rate_limit_waits[0][1] < window_start:
+            self.rate_limit_waits.popleft()
+
+        waited: float = 0.0
+        covered_until: float = window_start
+        for started, ended in sorted(self.rate_limit_waits):
+            started = max(started, covered_until)
+            if ended > started:
+                waited += ended - started
+                covered_until = ended
+        return waited
+
+    def pressure(self, now: float) -> ServiceMode:
+        """
+        :return: The most degraded mode whose thresholds any current signal meets.
+        """
+        rate_limit_wait: float = self.rate_limit_wait(now)
+        level: ServiceMode = ServiceMode.FULL
+        for mode, (in_flight, loop_lag, waited) in self.thresholds.items():
+            if self.in_flight >= in_flight or self.loop_lag >= loop_lag or rate_limit_wait >= waited:
+                level = max(level, mode)
+        return level
+
+    def sample(self, loop_lag: float) -> bool:
+        """
+        Re-evaluates the service mode. Degradation is immediate, whereas recovery steps back one mode at a time once
+        pressure has stayed below the current mode for the recovery delay.
+        :param loop_lag: How late the calling monitor tick ran, in seconds.
+        :return: True if the controller has just returned to full service.
+        """
+        now: float = time.monotonic()
+        self.loop_lag = loop_lag
+        level: ServiceMode = self.pressure(now)
+        if level >= self.mode:
+            if level > self.mode:
+                self.set_mode(level, now)
+            self.last_pressure_time = now
+            return False
+
+        if now - self.last_pressure_time < self.recovery_delay:
+            return False
+
+        self.set_mode(ServiceMode(self.mode - 1), now)
+        self.last_pressure_time = now
+        return self.mode == ServiceMode.FULL
+
+    def set_mode(self, mode: ServiceMode, now: float):
+        logging.log(logging.WARNING,
+                    f"Service mode changed from {self.mode.name} to {mode.name} "
+                    f"(in flight: {self.in_flight}, loop lag: {self.loop_lag:.3f}s, "
+                    f"rate limit wait: {self.rate_limit_wait(now):.1f}s)")
+        self.mode = mode
+        self.mode_changes[mode] += 1
+
+    def should_defer_auto_reacts(self) -> bool:
+        return self.mode >= ServiceMode.DEFER_AUTO_REACTS
+
+    def should_skip_edit(self, starboard_message_id: int) -> bool:
+        """
+        :return: True if the given starboard message was edited too recently for the current mode. Records the edit
+        otherwise.
+        """
+        now: float = time.monotonic()
+        last_edit: float | None = self.last_edits.get(starboard_message_id)
+        if (self.mode >= ServiceMode.THROTTLE_EDITS and last_edit is not None
+                and now - last_edit < self.edit_interval):
+            return True
+        self.last_edits[starboard_message_id] = now
+        return False
+
+    def should_shed_reply_context(self) -> bool:
+        return self.mode >= ServiceMode.SHED_REPLY_CONTEXT
+
+    def defer(self, key: object, job: Callable[[], Awaitable[None]]):
+        self.deferred[key] = job
+
+    def defer_edit(self, starboard_message_id: int, job: Callable[[], Awaitable[None]]):
+        self.pending_edits[starboard_message_id] = job
+
+    def pop_due_edits(self) -> list[Callable[[], Awaitable[None]]]:
+        """
+        :return: The trailing edits of every throttled post whose edit interval has ended, regardless of the mode.
+        """
+        now: float = time.monotonic()
+        due: list[int] = [message_id for message_id in self.pending_edits
+                          if now - self.last_edits.get(message_id, 0.0) >= self.edit_interval]
+        return [self.pending_edits.pop(message_id) for message_id in due]
+
+    def pop_deferred(self) -> list[Callable[[], Awaitable[None]]]:
+        jobs: list[Callable[[], Awaitable[None]]] = list(self.deferred.values())
+        self.deferred.clear()
+        return jobs
+
+    def prune_edits(self):
+        """
+        Forgets edit timestamps old enough that they can no longer throttle anything.
+        """
+        now: float = time.monotonic()
+        self.last_edits = {message_id: edited for message_id, edited in self.last_edits.items()
+                           if now - edited < self.edit_interval or message_id in self.pending_edits}
@@ -0,0 +1,135 @@
+import asyncio
+import cProfile
+import io
+import os
+import pstats
+import tracemalloc
+from datetime import datetime
+from types import CoroutineType
+from typing import List
+
+
+class Profiler:
+    """
+    Captures on-demand profiling reports covering CPU time, allocations and pending asyncio tasks. Nothing is traced
+    outside a capture window, so an idle profiler costs nothing.
+    """
+
+    active: bool
+    """
+    Whether a capture window is currently open.
+    """
+
+    report_dir: str
+    """
+    The directory reports are written to.
+    """
+
+    top_count: int
+    """
+    How many entries the CPU and allocation sections of a report list.
+    """
+
+    max_reports: int
+    """
+    How many reports are kept on disk; the oldest are deleted as new ones are written.
+    """
+
+    def __init__(self, report_dir: str = "reports/", top_count: int = 25, max_reports: int = 10):
+        self.active = False
+        self.report_dir = report_dir
+        self.top_count = top_count
+        self.max_reports = max_reports
+
+    async def capture(self, seconds: int) -> str | None:
+        """
+        Profiles the bot for a fixed window, then writes a report and switches every tracer back off.
+        :param seconds: The length of the capture window.
+        :return: The path of the written report, or None if a capture was already running.
+        """
+        if self.active:
+            return None
+        self.active = True
+
+        started_tracemalloc: bool = not tracemalloc.is_tracing()
+        profile: cProfile.Profile = cProfile.Profile()
+        try:
+            if started_tracemalloc:
+                tracemalloc.start()
+            allocations_before: tracemalloc.Snapshot = tracemalloc.take_snapshot()
+            started_at: datetime = datetime.now()
+
+            profile.enable()
+            try:
+                await asyncio.sleep(seconds)
+                # Dump tasks while the window is still open, so the handlers it caught are still pending.
+                task_dump: str = self.dump_tasks()
+            finally:
+                profile.disable()
+
+            allocations_after: tracemalloc.Snapshot = tracemalloc.take_snapshot()
+            report: str = "\n\n".join([
+                f"Profiling report from {started_at} over {seconds} seconds",
+                self.format_cpu(profile),
+                self.format_allocations(allocations_before, allocations_after),
+                task_dump
+            ])
+            return self.write_report(report, started_at)
+        finally:
+            if started_tracemalloc:
+                tracemalloc.stop()
+            self.active = False
+
+    def format_cpu(self, profile: cProfile.Profile) -> str:
+        output = io.StringIO()
+        stats: pstats.Stats = pstats.Stats(profile, stream=output)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.top_count)
+        return f"== CPU time (top {self.top_count} by cumulative time) ==\n{output.getvalue()}"
+
+    def format_allocations(self, before: tracemalloc.Snapshot, after: tracemalloc.Snapshot) -> str:
+        differences: List[tracemalloc.StatisticDiff] = after.compare_to(before, "lineno")[:self.top_count]
+        lines: List[str] = [str(difference) for difference in differences]
+        return f"== Allocations (top {self.top_count} by growth) ==\n" + "\n".join(lines)
+
+    def dump_tasks(self) -> str:
+        lines: List[str] = []
+        stuck_count: int = 0
+        for task in asyncio.all_tasks():
+            if task is asyncio.current_task():
+                continue
+            chain: List[str] = []
+            awaiting = task.get_coro()
+            while isinstance(awaiting, CoroutineType):
+                frame = awaiting.cr_frame
+                location: str = ""
+                if frame is not None:
+                    location = f" ({os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno})"
+                chain.append(f"{awaiting.__qualname__}{location}")
+                awaiting = awaiting.cr_await
+            if awaiting is not None:
+                chain.append(repr(awaiting))
+
+            is_handler: bool = any(".handle_" in link for link in chain)
+            stuck_count += is_handler
+            marker: str = "* " if is_handler else "  "
+            lines.append(f"{marker}{task.get_name()}: " + " -> ".join(chain))
+
+        return (f"== Asyncio tasks ({len(lines)} pending, {stuck_count} inside handle_* coroutines, marked *) ==\n" +
+                "\n".join(sorted(lines)))
+
+    def write_report(self, report: str, started_at: datetime) -> str:
+        if not os.path.exists(self.report_dir):
+            os.makedirs(self.report_dir)
+
+        path: str = f"{self.report_dir}profile-{started_at.strftime('%Y%m%d-%H%M%S')}.txt"
+        with open(path, "w") as file:
+            file.write(report)
+        self.rotate_reports()
+        return path
+
+    def rotate_reports(self):
+        # Report names embed their timestamp, so sorting them by name sorts them by age.
+        reports: List[str] = sorted(name for name in os.listdir(self.report_dir)
+                                    if name.startswith("profile-") and name.endswith(".txt"))
+        for name in reports[:max(0, len(reports) - self.max_reports)]:
+            os.remove(os.path.join(self.report_dir, name))
@@ -1,16 +1,23 @@
+import asyncio
 import logging
 import os
 import pickle
+import time
 from datetime import datetime
-from typing import Dict, Annotated, List, Tuple, Set
+from typing import Dict, Annotated, List, Tuple, Set, Callable, Awaitable, Coroutine, Any
 
 import discord
 from discord import Guild, channel, Message, Embed, Reaction, User, Attachment, Member
 from discord.ext import tasks, commands
 
+from src.features.overload import OverloadController
+from src.features.profiler import Profiler
 from src.features.starboard_server import StarboardServer, load_reaction_data
+from src.features.warmup import WarmUp
 from src.utils.bidictionary import BiDict
-from src.utils.emoji import emoji_id
+from src.utils.emoji import emoji_id, partial_emoji_id
+from src.utils.lru_cache import LRUCache
+from src.utils.memory import current_rss_mib, peak_rss_mib
 
 
 # noinspection PyMethodMayBeStatic
@@ -22,16 +29,116 @@ class Starboard(commands.Bot):
     # This will probably also become a dictionary
     starboard_limiter: Annotated[int, "The number of reactions to qualify for starboard."] = 3
 
-    def __init__(self, command_prefix: str, intents: discord.Intents):
+    low_memory: Annotated[bool, "Whether py-cord's message cache is dropped and our own caches shrunk"]
+
+    author_profiles: Annotated[LRUCache[Tuple[int, int], Tuple[str, str]],
+                               "Associates a (server ID, user ID) pair to that member's display name and avatar URL"]
+
+    # Nickname and avatar changes show up on new starboard posts at most this many seconds late.
+    author_profile_ttl: float = 300
+
+    reactor_cache: Annotated[LRUCache[Tuple[int, int | str], Set[int]],
+                             "Associates a (message ID, emoji) pair to the IDs of every user who reacted with it"]
+
+    message_cache: Annotated[LRUCache[int, Message], "Associates a message ID to a previously fetched message"]
+
+    # Edits and deletions are also evicted as they happen; this bounds staleness if such an event is missed.
+    message_cache_ttl: float = 300
+
+    warm_up: Annotated[WarmUp | None, "The startup warm-up, once it has been started"] = None
+
+    overload: Annotated[OverloadController, "Decides how much work handlers may do under the current load"]
+
+    background_tasks: Annotated[Set[asyncio.Task], "Holds on to background tasks until they finish"]
+
+    profiler: Annotated[Profiler, "Captures on-demand CPU, allocation and task reports"]
+
+    def __init__(self, command_prefix: str, intents: discord.Intents, low_memory: bool = False):
         self.server_data = {}
         self.starboard_channels = {}
-        super().__init__(command_prefix=command_prefix, help_command=None, intents=intents)
+        self.low_memory = low_memory
+        self.overload = OverloadController()
+        self.background_tasks = set()
+        self.profiler = Profiler()
+        if low_memory:
+            # The starboard always fetches messages over REST, so py-cord's message cache only costs memory. The member
+            # settings already match py-cord's defaults under Intents.default(), and only pin them down explicitly.
+            self.author_profiles = LRUCache(256, self.author_profile_ttl)
+            self.reactor_cache = LRUCache(512)
+            self.message_cache = LRUCache(128, self.message_cache_ttl)
+            super().__init__(command_prefix=command_prefix, help_command=None, intents=intents,
+                             max_messages=None,
+                             member_cache_flags=discord.MemberCacheFlags.none(),
+                             chunk_guilds_at_startup=False)
+        else:
+            self.author_profiles = LRUCache(2048, self.author_profile_ttl)
+            self.reactor_cache = LRUCache(4096)
+            self.message_cache = LRUCache(1024, self.message_cache_ttl)
+            super().__init__(command_prefix=command_prefix, help_command=None, intents=intents)
+        self.overload.time_requests(self.http)
 
     async def on_ready(self):
         print(f'Logged on as {self.user}!')
         for guild in self.guilds:
             if guild.id not in self.server_data:
                 self.server_data[guild.id] = load_reaction_data(guild.id)
+        self.log_memory_usage()
+
+        # on_ready fires again whenever the gateway re-identifies instead of resuming. The reaction and message events
+        # missed in between would leave the reactor and message caches silently stale, so they are dropped instead of
+        # being warmed again.
+        if self.warm_up is None:
+            self.warm_up = WarmUp(self)
+            self.spawn(self.warm_up.run())
+        else:
+            self.reactor_cache.clear()
+            self.message_cache.clear()
+
+    async def on_raw_message_edit(self, payload: discord.RawMessageUpdateEvent):
+        self.message_cache.pop(payload.message_id)
+
+    async def on_raw_message_delete(self, payload: discord.RawMessageDeleteEvent):
+        self.message_cache.pop(payload.message_id)
+
+    async def on_raw_bulk_message_delete(self, payload: discord.RawBulkMessageDeleteEvent):
+        for message_id in payload.message_ids:
+            self.message_cache.pop(message_id)
+
+    def log_memory_usage(self):
+        print(f"Memory usage ({'low-memory' if self.low_memory else 'default'} profile, {len(self.guilds)} guilds): "
+              f"{current_rss_mib():.1f} MiB RSS, {peak_rss_mib():.1f} MiB peak, "
+              f"{len(self.author_profiles)} cached author profiles, {len(self.reactor_cache)} cached reactor sets, "
+              f"{len(self.message_cache)} cached messages")
+
+    async def fetch_author_profile(self, guild: Guild, user_id: int) -> Tuple[str, str]:
+        """
+        Fetches the display name and avatar URL of a member, going through the bot-owned profile cache first. Cached
+        profiles expire after author_profile_ttl seconds so that nickname and avatar changes are picked up.
+        :param guild: The server the member belongs to.
+        :param user_id: The snowflake of the member.
+        :return: A tuple of the member's display name and display avatar URL.
+        """
+        profile: Tuple[str, str] | None = self.author_profiles.get((guild.id, user_id))
+        if profile is None:
+            member: Member = await guild.fetch_member(user_id)
+            profile = (member.display_name, member.display_avatar.url)
+            self.author_profiles[(guild.id, user_id)] = profile
+        return profile
+
+    async def fetch_reactors(self, reaction: Reaction) -> Set[int]:
+        """
+        Fetches the IDs of every user behind a reaction, going through the bot-owned reactor cache first. A cached set
+        is only trusted while its size agrees with the reaction's count.
+        :param reaction: The reaction whose users are requested.
+        :return: The set of user IDs who reacted. This is the cached set itself and must not be modified.
+        """
+        key: Tuple[int, int | str] = (reaction.message.id, emoji_id(reaction.emoji))
+        reactors: Set[int] | None = self.reactor_cache.get(key)
+        if reactors is None or len(reactors) != reaction.count:
+            all_users: List[User] = await reaction.users().flatten()
+            reactors = {user.id for user in all_users}
+            self.reactor_cache[key] = reactors
+        return reactors
 
     # Actually gross
     async def safe_get_data(self, payload: discord.RawReactionActionEvent) -> \
@@ -57,6 +164,10 @@ class Starboard(commands.Bot):
         return guild, starboard_channel_id, starboard_channel, message_channel, reacted_message
 
     async def on_raw_reaction_add(self, payload: discord.RawReactionActionEvent):
+        with self.overload.track():
+            await self.handle_reaction_add(payload)
+
+    async def handle_reaction_add(self, payload: discord.RawReactionActionEvent):
         starboard_server: StarboardServer = self.server_data.get(payload.guild_id)
         if starboard_server is None:
             starboard_server = StarboardServer(payload.guild_id, BiDict(), {}, {})
@@ -65,6 +176,11 @@ class Starboard(commands.Bot):
         starboard_server.latest_reaction_time = datetime.now()
         starboard_server.reaction_channel[payload.message_id] = payload.channel_id
 
+        cached_reactors: Set[int] | None = self.reactor_cache.get((payload.message_id,
+                                                                   partial_emoji_id(payload.emoji)))
+        if cached_reactors is not None:
+            cached_reactors.add(payload.user_id)
+
         data: tuple[Guild, int, channel, channel, Message] = await self.safe_get_data(payload)
         if data is None:
             return
@@ -85,6 +201,11 @@ class Starboard(commands.Bot):
                                                  reacted_message)
 
     async def handle_auto_reacts(self, starboard_message: Message, reacted_message: Message):
+        if self.overload.should_defer_auto_reacts():
+            self.overload.defer(("auto_reacts", starboard_message.id),
+                                lambda: self.handle_auto_reacts(starboard_message, reacted_message))
+            return
+
         for reaction in reacted_message.reactions:
             if (reaction.count >= self.starboard_limiter and
                     (type(reaction.emoji) is str or self.get_emoji(reaction.emoji.id) is not None)):
@@ -109,6 +230,11 @@ class Starboard(commands.Bot):
         if original_message_id is None or original_channel_id is None:
             return
 
+        if self.overload.should_skip_edit(starboard_message_id):
+            self.overload.defer_edit(starboard_message_id,
+                                     lambda: self.refresh_starboard_post(guild.id, original_message_id))
+            return
+
         original_message_channel = guild.get_channel(original_channel_id)
         message = await original_message_channel.fetch_message(original_message_id)
         if message is None:
@@ -142,6 +268,11 @@ class Starboard(commands.Bot):
         :param reacted_message:
         :return:
         """
+        if self.overload.should_skip_edit(starboard_message_id):
+            self.overload.defer_edit(starboard_message_id,
+                                     lambda: self.refresh_starboard_post(guild.id, reacted_message.id))
+            return
+
         message = await starboard_channel.fetch_message(starboard_message_id)
         if message is None:
             return
@@ -161,6 +292,35 @@ class Starboard(commands.Bot):
         await self.handle_auto_reacts(message, reacted_message)
         await self.update_server_experience(starboard_server, reacted_message, experience)
 
+    async def refresh_starboard_post(self, guild_id: int, original_message_id: int):
+        """
+        Re-fetches a starboard-ed post and brings its starboard variant up to date. Used to replay edits that were
+        skipped while under load.
+        :param guild_id:
+        :param original_message_id:
+        :return:
+        """
+        guild: Guild = self.get_guild(guild_id)
+        starboard_server: StarboardServer = self.server_data.get(guild_id)
+        if guild is None or starboard_server is None:
+            return
+
+        starboard_message_id: int = starboard_server.reaction_data.f_get(original_message_id)
+        original_channel_id: int = starboard_server.reaction_channel.get(original_message_id)
+        starboard_channel_id: int = self.starboard_channels.get(guild_id)
+        if starboard_message_id is None or original_channel_id is None or starboard_channel_id is None:
+            return
+
+        starboard_channel: channel = guild.get_channel(starboard_channel_id)
+        original_channel: channel = guild.get_channel(original_channel_id)
+        if starboard_channel is None or original_channel is None:
+            return
+
+        original_message: Message = await original_channel.fetch_message(original_message_id)
+        await self.handle_edit_starboard(starboard_server, guild, starboard_channel, starboard_message_id,
+                                         original_message)
+        starboard_server.save_reaction_data()
+
     async def handle_send_starboard(self, payload: discord.RawReactionActionEvent,
                                     starboard_server: StarboardServer,
                                     guild: Guild,
@@ -196,6 +356,10 @@ class Starboard(commands.Bot):
         starboard_server.save_reaction_data()
 
     async def on_raw_reaction_remove(self, payload: discord.RawReactionActionEvent):
+        with self.overload.track():
+            await self.handle_reaction_remove(payload)
+
+    async def handle_reaction_remove(self, payload: discord.RawReactionActionEvent):
         starboard_server: StarboardServer = self.server_data.get(payload.guild_id)
         if starboard_server is None:
             starboard_server = StarboardServer(payload.guild_id, BiDict(), {}, {})
@@ -203,6 +367,11 @@ class Starboard(commands.Bot):
 
         starboard_server.latest_reaction_time = datetime.now()
 
+        cached_reactors: Set[int] | None = self.reactor_cache.get((payload.message_id,
+                                                                   partial_emoji_id(payload.emoji)))
+        if cached_reactors is not None:
+            cached_reactors.discard(payload.user_id)
+
         data: tuple[Guild, int, channel, channel, Message] = await self.safe_get_data(payload)
         if data is None:
             return
@@ -236,16 +405,16 @@ class Starboard(commands.Bot):
         reaction_tracker: Dict[int | str, set[int]] = {}
         if starboard_reactions is not None:
             for reaction in starboard_reactions:
-                all_users: List[User] = await reaction.users().flatten()
-                reaction_tracker[emoji_id(reaction.emoji)] = {user.id for user in all_users
-                                                              if user.id != self.application_id
-                                                              and user.id != post_author_id}
+                all_reactors: Set[int] = await self.fetch_reactors(reaction)
+                reaction_tracker[emoji_id(reaction.emoji)] = {user_id for user_id in all_reactors
+                                                              if user_id != self.application_id
+                                                              and user_id != post_author_id}
 
         experience: int = 0
         for reaction in post_reactions:
-            all_users: List[User] = await reaction.users().flatten()
-            reactors: Set[id] = {user.id for user in all_users if user.id != self.application_id
-                                 and user.id != post_author_id}
+            all_reactors: Set[int] = await self.fetch_reactors(reaction)
+            reactors: Set[int] = {user_id for user_id in all_reactors if user_id != self.application_id
+                                  and user_id != post_author_id}
             emoji_identifier: int | str = emoji_id(reaction.emoji)
             if emoji_identifier in reaction_tracker:
                 reactors.update(reaction_tracker[emoji_identifier])
@@ -300,32 +469,36 @@ class Starboard(commands.Bot):
                 message_embed.colour = 0x70aeff
                 output.append(message_embed)
 
-        if message.reference is not None:
+        if message.reference is not None and not self.overload.should_shed_reply_context():
             try:
-                replied_message: Message = await message.channel.fetch_message(message.reference.message_id)
-                replied_author: Member = await guild.fetch_member(replied_message.author.id)
+                replied_message: Message | None = self.message_cache.get(message.reference.message_id)
+                if replied_message is None:
+                    replied_message = await message.channel.fetch_message(message.reference.message_id)
+                    self.message_cache[replied_message.id] = replied_message
+                replied_author_name, replied_author_avatar = await self.fetch_author_profile(
+                    guild, replied_message.author.id)
                 replied_message_content: str = replied_message.system_content if replied_message.system_content != "" \
                     else replied_message.content
                 replied_embed: Embed = discord.Embed(
                     color=0x2b2d31,
                     author=discord.EmbedAuthor(
-                        name=f"Replying to {replied_author.display_name}",
+                        name=f"Replying to {replied_author_name}",
                         url=replied_message.jump_url,
-                        icon_url=replied_author.display_avatar.url),
+                        icon_url=replied_author_avatar),
                     timestamp=replied_message.created_at,
                     description=replied_message_content)
                 handle_multiple_attachments(replied_message, replied_embed)
             except Exception as exception:
                 logging.log(logging.ERROR, exception)
 
-        message_author: Member = await guild.fetch_member(message.author.id)
+        message_author_name, message_author_avatar = await self.fetch_author_profile(guild, message.author.id)
         message_content: str = message.system_content if message.system_content != "" else message.content
         embed: Embed = discord.Embed(
             color=0x70aeff,
             author=discord.EmbedAuthor(
-                name=message_author.display_name,
+                name=message_author_name,
                 url=message.jump_url,
-                icon_url=message_author.display_avatar.url),
+                icon_url=message_author_avatar),
             timestamp=message.created_at,
             description=message_content)
         handle_multiple_attachments(message, embed)
@@ -341,6 +514,54 @@ class Starboard(commands.Bot):
 
         print(f"Attempting to save server data at: {datetime.now()}")
         await self.save()
+        self.log_memory_usage()
+        print("Service mode changes: " +
+              ", ".join(f"{mode.name} {count}" for mode, count in self.overload.mode_changes.items()))
+
+    last_monitor_tick: float | None = None
+
+    @tasks.loop(seconds=1)
+    async def monitor_load(self):
+        now: float = time.monotonic()
+        loop_lag: float = 0.0 if self.last_monitor_tick is None else max(0.0, now - self.last_monitor_tick - 1.0)
+        self.last_monitor_tick = now
+
+        self.overload.prune_edits()
+        due_edits: List[Callable[[], Awaitable[None]]] = self.overload.pop_due_edits()
+        if len(due_edits) > 0:
+            self.spawn(self.run_jobs(due_edits))
+
+        if self.overload.sample(loop_lag):
+            postponed: List[Callable[[], Awaitable[None]]] = self.overload.pop_deferred()
+            if len(postponed) > 0:
+                print(f"Replaying {len(postponed)} postponed auto-reacts.")
+                self.spawn(self.run_jobs(postponed))
+
+    def spawn(self, coroutine: Coroutine[Any, Any, Any]) -> asyncio.Task:
+        """
+        Runs a coroutine in the background, holding a reference to its task until it finishes so that it cannot be
+        garbage collected midway.
+        """
+        task: asyncio.Task = asyncio.create_task(coroutine)
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
+        return task
+
+    async def capture_profile(self, seconds: int) -> str | None:
+        print(f"Profiling for {seconds} seconds at: {datetime.now()}")
+        path: str | None = await self.profiler.capture(seconds)
+        if path is None:
+            print("A profiling capture is already running.")
+        else:
+            print(f"Profiling report written to {path}")
+        return path
+
+    async def run_jobs(self, jobs: List[Callable[[], Awaitable[None]]]):
+        for job in jobs:
+            try:
+                await job()
+            except Exception as exception:
+                logging.log(logging.ERROR, exception)
 
     async def save(self):
         try:
@@ -0,0 +1,175 @@
+import asyncio
+import logging
+import math
+import time
+from typing import TYPE_CHECKING, List, Set, Tuple
+
+from discord import Guild, Message, Reaction
+
+from src.features.overload import ServiceMode, background_requests
+from src.features.starboard_server import StarboardServer
+from src.utils.emoji import emoji_id
+
+if TYPE_CHECKING:
+    from src.features.starboard import Starboard
+
+
+class WarmUp:
+    """
+    Prefetches the state behind each server's most recent starboard posts after a restart, so that the first reaction
+    on a hot post does not pay for cold message, member and reactor lookups. Never warms more entries than a cache can
+    hold, so that the warm-up does not evict its own work.
+    """
+
+    post_count: int = 25
+    """
+    How many of the most recent posts in each starboard channel are warmed.
+    """
+
+    concurrency: int = 4
+    """
+    How many warm-up requests may be in flight at once across every server.
+    """
+
+    rest_budget: int = 500
+    """
+    The most REST requests the warm-up may spend before giving up on the remaining posts.
+    """
+
+    pause_interval: float = 1.0
+    """
+    How many seconds the warm-up sleeps between checks while the bot is not in full service.
+    """
+
+    bot: "Starboard"
+    semaphore: asyncio.Semaphore
+    rest_calls: int
+    warmed_authors: Set[Tuple[int, int]]
+    warmed_replies: Set[int]
+    warmed_reactors: Set[Tuple[int, int | str]]
+    duration: float | None
+
+    def __init__(self, bot: "Starboard"):
+        self.bot = bot
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        self.rest_calls = 0
+        self.warmed_authors = set()
+        self.warmed_replies = set()
+        self.warmed_reactors = set()
+        self.duration = None
+
+    async def spend(self, calls: int) -> bool:
+        """
+        Reserves REST requests from the budget, first waiting out any degraded service so that the warm-up never
+        competes with live reaction handling for rate limits. The warm-up's own requests are excluded from that signal.
+        :param calls: The number of requests about to be made.
+        :return: True if the budget allows them, in which case they are counted as spent.
+        """
+        while self.bot.overload.mode != ServiceMode.FULL:
+            await asyncio.sleep(self.pause_interval)
+
+        if self.rest_calls + calls > self.rest_budget:
+            return False
+        self.rest_calls += calls
+        return True
+
+    async def run(self):
+        # Applies to this task and, through asyncio.gather, every request the warm-up makes.
+        background_requests.set(True)
+        started: float = time.monotonic()
+        await asyncio.gather(*(self.warm_guild(guild) for guild in self.bot.guilds))
+        self.duration = time.monotonic() - started
+
+        # Entries may since have been evicted or expired, so only those still resident are reported.
+        reply_targets: int = sum(message_id in self.bot.message_cache for message_id in self.warmed_replies)
+        reactor_sets: int = sum(key in self.bot.reactor_cache for key in self.warmed_reactors)
+        author_profiles: int = sum(key in self.bot.author_profiles for key in self.warmed_authors)
+        print(f"Warm-up finished in {self.duration:.2f}s: {reply_targets} replied-to messages, "
+              f"{reactor_sets} reactor sets and {author_profiles} author profiles still cached "
+              f"using {self.rest_calls}/{self.rest_budget} REST requests.")
+
+    async def warm_guild(self, guild: Guild):
+        starboard_server: StarboardServer = self.bot.server_data.get(guild.id)
+        starboard_channel_id: int = self.bot.starboard_channels.get(guild.id)
+        if starboard_server is None or starboard_channel_id is None:
+            return
+
+        starboard_channel = guild.get_channel(starboard_channel_id)
+        if starboard_channel is None or not await self.spend(math.ceil(self.post_count / 100)):
+            return
+
+        try:
+            async with self.semaphore:
+                posts: List[Message] = await starboard_channel.history(limit=self.post_count).flatten()
+        except Exception as exception:
+            logging.log(logging.ERROR, exception)
+            return
+
+        await asyncio.gather(*(self.warm_post(guild, starboard_server, post) for post in posts))
+
+    async def warm_post(self, guild: Guild, starboard_server: StarboardServer, post: Message):
+        original_message_id: int = starboard_server.reaction_data.b_get(post.id)
+        original_channel_id: int = starboard_server.reaction_channel.get(original_message_id)
+        if original_message_id is None or original_channel_id is None:
+            return
+
+        original_channel = guild.get_channel(original_channel_id)
+        if original_channel is None:
+            return
+
+        try:
+            await self.warm_reactors(post.reactions)
+
+            if not await self.spend(1):
+                return
+            async with self.semaphore:
+                original_message: Message = await original_channel.fetch_message(original_message_id)
+
+            await self.warm_reactors(original_message.reactions)
+            await self.warm_author(guild, original_message.author.id)
+
+            # The original itself is re-fetched on every event for its reaction counts; only the message it replies
+            # to is read from the message cache, by create_embed.
+            if original_message.reference is not None and original_message.reference.message_id is not None:
+                await self.warm_reply_target(guild, original_message)
+        except Exception as exception:
+            logging.log(logging.ERROR, exception)
+
+    async def warm_reply_target(self, guild: Guild, original_message: Message):
+        replied_message_id: int = original_message.reference.message_id
+        if (replied_message_id in self.warmed_replies or replied_message_id in self.bot.message_cache
+                or len(self.warmed_replies) >= self.bot.message_cache.max_size):
+            return
+        self.warmed_replies.add(replied_message_id)
+
+        if not await self.spend(1):
+            return
+
+        async with self.semaphore:
+            replied_message: Message = await original_message.channel.fetch_message(replied_message_id)
+        self.bot.message_cache[replied_message.id] = replied_message
+        await self.warm_author(guild, replied_message.author.id)
+
+    async def warm_author(self, guild: Guild, user_id: int):
+        # The key is reserved before awaiting so that concurrent posts by the same author fetch them only once.
+        key: Tuple[int, int] = (guild.id, user_id)
+        if (key in self.warmed_authors or key in self.bot.author_profiles
+                or len(self.warmed_authors) >= self.bot.author_profiles.max_size):
+            return
+        self.warmed_authors.add(key)
+
+        if not await self.spend(1):
+            return
+        async with self.semaphore:
+            await self.bot.fetch_author_profile(guild, user_id)
+
+    async def warm_reactors(self, reactions: List[Reaction]):
+        for reaction in reactions:
+            if len(self.warmed_reactors) >= self.bot.reactor_cache.max_size:
+                return
+            self.warmed_reactors.add((reaction.message.id, emoji_id(reaction.emoji)))
+
+            if not await self.spend(max(1, math.ceil(reaction.count / 100))):
+                return
+            async with self.semaphore:
+                await self.bot.fetch_reactors(reaction)
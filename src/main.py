@@ -1,5 +1,7 @@
 import asyncio
 import datetime
+import os
+import signal
 from typing import List, Tuple, Dict
 
 import discord
@@ -13,7 +15,10 @@ from src.features.starboard_server import StarboardServer
 intents = discord.Intents.default()
 intents.message_content = True
 
-client = Starboard(command_prefix='$', intents=intents)
+# Set STARBOARD_LOW_MEMORY=1 to drop py-cord's message cache and shrink the bot's own caches.
+low_memory: bool = os.environ.get("STARBOARD_LOW_MEMORY", "0") == "1"
+
+client = Starboard(command_prefix='$', intents=intents, low_memory=low_memory)
 client.load()
 
 
@@ -32,6 +37,24 @@ async def set(ctx: ApplicationContext, channel: discord.Option(TextChannel)):
         await ctx.respond(f"👅 𝔉𝔯𝔢𝔞𝔨𝔶 𝔐𝔬𝔡𝔢 𝔄𝔠𝔱𝔦𝔳𝔞𝔱𝔢𝔡; I'm gonna touch you {ctx.author.global_name} 👅.", ephemeral=True)
 
 
+@client.slash_command(description="Captures a profiling report of the bot.")
+async def profile(ctx: ApplicationContext,
+                  seconds: discord.Option(int, min_value=5, max_value=300, default=30)):
+    # Profiling covers the whole process, every server included, so it is reserved for the bot's owner.
+    if not await client.is_owner(ctx.author):
+        await ctx.respond("Only the bot's owner may profile the bot.", ephemeral=True)
+        return
+
+    if client.profiler.active:
+        await ctx.respond("A profiling capture is already running.", ephemeral=True)
+        return
+
+    await ctx.respond(f"Profiling the bot for {seconds} seconds.", ephemeral=True)
+    path: str | None = await client.capture_profile(seconds)
+    if path is not None:
+        await ctx.followup.send(f"Profiling report written to `{path}`.", ephemeral=True)
+
+
 class LeaderboardView(discord.ui.View):  # Create a class called MyView that subclasses discord.ui.View
     view: int
     content: List[str]
@@ -175,6 +198,11 @@ with open("token.txt", "r") as file:
 async def main():
     async with client:
         client.listen.start()
+        client.monitor_load.start()
+        # `kill -USR1 <pid>` captures a one minute profiling report without going through Discord.
+        if hasattr(signal, "SIGUSR1"):
+            asyncio.get_running_loop().add_signal_handler(
+                signal.SIGUSR1, lambda: client.spawn(client.capture_profile(60)))
         await client.start(token)
 
 
@@ -1,5 +1,13 @@
-from discord import Emoji
+from discord import Emoji, PartialEmoji
 
 
 def emoji_id(emoji: Emoji) -> int | str:
     return emoji if type(emoji) is str else emoji.id
+
+
+def partial_emoji_id(emoji: PartialEmoji) -> int | str:
+    """
+    :return: The same identifier emoji_id gives the matching reaction emoji, as partial emojis carry unicode emojis
+    in their name rather than as a string.
+    """
+    return emoji.name if emoji.id is None else emoji.id
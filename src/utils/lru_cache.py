@@ -0,0 +1,69 @@
+import time
+from collections import OrderedDict
+from typing import TypeVar, Tuple
+
+K = TypeVar("K")
+V = TypeVar("V")
+
+
+class LRUCache[K, V]:
+    """
+    A size-bounded dictionary that evicts its least recently used entry once full, and optionally any entry older
+    than its time to live.
+    """
+
+    max_size: int
+    ttl: float | None
+    entries: OrderedDict[K, Tuple[V, float]]
+
+    def __init__(self, max_size: int, ttl: float | None = None):
+        """
+        :param max_size: The most entries the cache holds at once.
+        :param ttl: How many seconds an entry stays valid after being set, or None to keep entries until evicted.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+
+    def __setitem__(self, key: K, value: V):
+        self.entries[key] = (value, time.monotonic())
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def __contains__(self, key: K) -> bool:
+        """
+        :return: True if key is present in the cache and has not expired. Unlike get, this leaves recency untouched.
+        """
+        entry: Tuple[V, float] | None = self.entries.get(key)
+        return entry is not None and (self.ttl is None or time.monotonic() - entry[1] <= self.ttl)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, key: K) -> V | None:
+        """
+        :return: The value for key if key is present in the cache and has not expired, else None. Marks the key as
+        recently used.
+        """
+        entry: Tuple[V, float] | None = self.entries.get(key)
+        if entry is None:
+            return None
+
+        value, set_at = entry
+        if self.ttl is not None and time.monotonic() - set_at > self.ttl:
+            del self.entries[key]
+            return None
+
+        self.entries.move_to_end(key)
+        return value
+
+    def pop(self, key: K) -> V | None:
+        """
+        :return: The removed value for key if key was present in the cache, else None.
+        """
+        entry: Tuple[V, float] | None = self.entries.pop(key, None)
+        return None if entry is None else entry[0]
+
+    def clear(self):
+        self.entries.clear()
@@ -0,0 +1,26 @@
+import resource
+import sys
+
+
+def peak_rss_mib() -> float:
+    """
+    :return: The peak resident set size of the current process in mebibytes.
+    """
+    peak_rss: int = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux reports kibibytes.
+    if sys.platform == "darwin":
+        return peak_rss / (1024 * 1024)
+    return peak_rss / 1024
+
+
+def current_rss_mib() -> float:
+    """
+    :return: The current resident set size of the current process in mebibytes, falling back to the peak where
+    /proc is unavailable.
+    """
+    try:
+        with open("/proc/self/statm", "r") as file:
+            resident_pages: int = int(file.readline().split()[1])
+        return resident_pages * resource.getpagesize() / (1024 * 1024)
+    except (OSError, IndexError, ValueError):
+        return peak_rss_mib()